@@ -1,17 +1,21 @@
 """
 Main Flask application for Smart Office Monitoring System
 """
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, stream_with_context
+from werkzeug.security import check_password_hash
 from database.models import db
 from modules.database_module import DatabaseManager
 from modules.vision_module import VisionSystem
 from modules.training_module import FaceTrainer
 from modules.action_module import ActionDetector
 from config import Config
-import cv2
+import hmac
+import orjson
 import os
+import threading
 from datetime import datetime
 from functools import wraps
+from multiprocessing import parent_process
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -21,20 +25,32 @@ Config.init_app()
 # Initialize database
 db.init_app(app)
 
-# Initialize modules
-vision_system = VisionSystem()
-face_trainer = FaceTrainer()
-action_detector = ActionDetector()
-
-# Load trained model if exists
-if face_trainer.load_model():
-    vision_system.set_recognizer(face_trainer.get_recognizer())
-    print("Loaded existing face recognition model")
-
-# Create database tables
-with app.app_context():
-    db.create_all()
-    print("Database tables created")
+# Training workers are spawned processes that re-import the entry script, and with
+# it this module; they only need modules.training_module, so the camera, pose graph,
+# model and database are set up in the main process only
+if parent_process() is None:
+    # Initialize modules
+    vision_system = VisionSystem(app=app)
+    face_trainer = FaceTrainer()
+    action_detector = ActionDetector()
+
+    # Load trained model if exists
+    if face_trainer.load_model():
+        vision_system.set_recognizer(face_trainer.get_recognizer())
+        print("Loaded existing face recognition model")
+
+    # Create database tables
+    with app.app_context():
+        db.create_all()
+        DatabaseManager.create_indexes()
+        DatabaseManager.refresh_employee_cache()
+        print("Database tables created")
+
+# ==================== JSON Helpers ====================
+
+def jsonify_fast(obj):
+    """jsonify replacement backed by orjson for the polled dashboard endpoints"""
+    return Response(orjson.dumps(obj), mimetype='application/json')
 
 # ==================== Authentication Decorator ====================
 
@@ -53,10 +69,14 @@ def login_required(f):
 def login():
     """Admin login page"""
     if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
+        username = request.form.get('username', '')
+        password = request.form.get('password', '')
         
-        if username == Config.ADMIN_USERNAME and password == Config.ADMIN_PASSWORD:
+        # Constant-time comparisons; check the hash even if the username is wrong
+        username_ok = hmac.compare_digest(username.encode(), Config.ADMIN_USERNAME.encode())
+        password_ok = check_password_hash(Config.ADMIN_PASSWORD_HASH, password)
+        
+        if username_ok and password_ok:
             session['logged_in'] = True
             session['username'] = username
             return redirect(url_for('dashboard'))
@@ -97,36 +117,53 @@ def dashboard():
 def get_current_attendance():
     """API endpoint for live attendance updates"""
     current = DatabaseManager.get_current_attendance()
-    return jsonify({'success': True, 'data': current})
+    return jsonify_fast({'success': True, 'data': current})
 
 @app.route('/api/recent_activity')
 @login_required
 def get_recent_activity():
     """API endpoint for recent activity"""
     activity = DatabaseManager.get_recent_activity(limit=10)
-    return jsonify({'success': True, 'data': activity})
+    return jsonify_fast({'success': True, 'data': activity})
+
+@app.route('/api/recent_events')
+@login_required
+def get_recent_events():
+    """API endpoint for entry/exit events seen by the vision system"""
+    return jsonify_fast({'success': True, 'data': vision_system.get_recent_events()})
 
 # ==================== Video Streaming ====================
 
+# Open /video_feed connections, capped so streams never take every server thread
+stream_slots = threading.BoundedSemaphore(Config.MAX_STREAM_VIEWERS)
+
 def generate_frames():
     """Generate frames for video streaming"""
+    last_id = None
+    
     while vision_system.is_running:
-        frame = vision_system.get_current_frame()
+        # Blocks until the monitoring thread publishes a new frame; an unchanged
+        # frame is never sent again, so idle viewers cost no bandwidth
+        frame_id, frame_bytes = vision_system.get_jpeg(last_id)
+        if frame_bytes is None or frame_id == last_id:
+            continue
         
-        if frame is not None:
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if ret:
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        last_id = frame_id
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
 
 @app.route('/video_feed')
 @login_required
 def video_feed():
     """Video streaming route"""
-    return Response(generate_frames(),
-                   mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Each stream occupies a server thread until the viewer disconnects
+    if not stream_slots.acquire(blocking=False):
+        return Response('Too many video stream viewers', status=503)
+    
+    response = Response(generate_frames(),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.call_on_close(stream_slots.release)
+    return response
 
 # ==================== Camera Control ====================
 
@@ -192,6 +229,7 @@ def add_employee():
             employee = DatabaseManager.get_employee_by_id(employee_id)
             employee.face_data_path = sample_result['folder_path']
             db.session.commit()
+            DatabaseManager.refresh_employee_cache()
             
             return jsonify({
                 'success': True,
@@ -223,6 +261,8 @@ def train_model():
         # Reload model in vision system
         if face_trainer.load_model():
             vision_system.set_recognizer(face_trainer.get_recognizer())
+        # Warm the employee cache for the newly trained labels
+        DatabaseManager.refresh_employee_cache()
     
     return jsonify(result)
 
@@ -245,7 +285,7 @@ def daily_report():
     else:
         attendance = DatabaseManager.get_daily_attendance()
     
-    return jsonify({'success': True, 'data': attendance})
+    return jsonify_fast({'success': True, 'data': attendance})
 
 @app.route('/api/export_csv')
 @login_required
@@ -255,31 +295,36 @@ def export_csv():
     from io import StringIO
     
     date_str = request.args.get('date')
-    attendance = DatabaseManager.get_daily_attendance(date_str)
-    
-    # Create CSV
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Employee Name', 'Department', 'Entry Time', 'Exit Time', 'Work Duration', 'Action', 'Status'])
     
-    # Write data
-    for record in attendance:
-        writer.writerow([
-            record['employee_name'],
-            record['department'],
-            record['entry_time'],
-            record['exit_time'] or 'N/A',
-            record['work_duration'] or 'N/A',
-            record['action'],
-            record['status']
-        ])
+    def generate():
+        # Format one row at a time into a small reusable buffer
+        output = StringIO()
+        writer = csv.writer(output)
+        
+        def line(row):
+            output.seek(0)
+            output.truncate(0)
+            writer.writerow(row)
+            return output.getvalue()
+        
+        # Write header
+        yield line(['Employee Name', 'Department', 'Entry Time', 'Exit Time', 'Work Duration', 'Action', 'Status'])
+        
+        # Write data
+        for record in DatabaseManager.iter_daily_attendance(date_str):
+            yield line([
+                record['employee_name'],
+                record['department'],
+                record['entry_time'],
+                record['exit_time'] or 'N/A',
+                record['work_duration'] or 'N/A',
+                record['action'],
+                record['status']
+            ])
     
     # Create response
-    output.seek(0)
     return Response(
-        output.getvalue(),
+        stream_with_context(generate()),
         mimetype='text/csv',
         headers={'Content-Disposition': f'attachment; filename=attendance_{date_str or "today"}.csv'}
     )
@@ -299,4 +344,5 @@ def server_error(e):
 # ==================== Main ====================
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
+    # Development server only; use wsgi.py (waitress) in production
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000, threaded=True)
@@ -11,6 +11,20 @@ class Config:
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'database', 'office_monitoring.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        # Size the pool to the server's worker threads
+        'pool_size': 8,
+        'max_overflow': 4,
+        'pool_pre_ping': True,
+        # Monitoring thread and request threads share the engine
+        'connect_args': {'check_same_thread': False}
+    }
+    
+    # Server settings
+    # Every open /video_feed holds a waitress thread for as long as it is connected,
+    # so viewers are capped and get their own threads on top of the request threads
+    MAX_STREAM_VIEWERS = 4  # Concurrent /video_feed connections; more get HTTP 503
+    SERVER_THREADS = 8 + MAX_STREAM_VIEWERS  # waitress worker threads (see wsgi.py)
     
     # Upload settings
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads', 'face_data')
@@ -18,26 +32,50 @@ class Config:
     
     # Admin credentials (change in production)
     ADMIN_USERNAME = 'admin'
-    ADMIN_PASSWORD = 'admin123'
+    # Only the hash is kept; set ADMIN_PASSWORD_HASH to a werkzeug hash in production.
+    # The default is a precomputed scrypt hash of 'admin123', so importing config
+    # (also done by every training worker) doesn't run scrypt
+    _DEFAULT_ADMIN_PASSWORD_HASH = (
+        'scrypt:32768:8:1$nlT9z5oKQuHcDHMT$'
+        '358101c92bd2890492923d6ad7938c041ceab7e8ba6cb0695b775953782a8b3a'
+        '8da4df4fbe93e6c6ed2db52cfb53009435e1560ec8723573403f677053d9fe31'
+    )
+    ADMIN_PASSWORD_HASH = os.environ.get('ADMIN_PASSWORD_HASH') or _DEFAULT_ADMIN_PASSWORD_HASH
     
     # Camera settings
     CAMERA_INDEX = 0  # Default webcam
     CAMERA_WIDTH = 640
     CAMERA_HEIGHT = 480
     CAMERA_FPS = 30
+    FRAME_SKIP = 3  # Decode and process every Nth captured frame (~10 FPS at 30 FPS)
+    STREAM_JPEG_QUALITY = 80  # JPEG quality for the /video_feed stream
     
     # Detection settings
     FACE_DETECTION_SCALE_FACTOR = 1.1
     FACE_DETECTION_MIN_NEIGHBORS = 5
     FACE_DETECTION_MIN_SIZE = (30, 30)
+    DETECTION_FRAME_WIDTH = 320  # Frames are downscaled to this width before face detection
+    # OpenCV DNN (ResNet-10 SSD) face detector; HOG is used if these files are missing
+    FACE_DNN_PROTOTXT = os.path.join(TRAINED_MODELS_FOLDER, 'deploy.prototxt')
+    FACE_DNN_MODEL = os.path.join(TRAINED_MODELS_FOLDER, 'res10_300x300_ssd_iter_140000.caffemodel')
+    FACE_DNN_CONFIDENCE = 0.5
+    
+    # Action detection settings
+    POSE_STRIDE = 2  # Run pose inference on every Nth frame, reuse results in between
     
     # Recognition settings
     RECOGNITION_CONFIDENCE_THRESHOLD = 70  # Lower is more confident (0-100)
     FACE_RECOGNITION_TOLERANCE = 0.6
+    TRACK_IOU_THRESHOLD = 0.7  # Box overlap needed to reuse the previous frame's identity
+    TRACK_REVERIFY_FRAMES = 10  # Re-encode a tracked face at least this often (processed frames)
     ENTRY_EXIT_COOLDOWN_MINUTES = 5  # Prevent duplicate entries within this time
+    EXIT_CHECK_INTERVAL_SECONDS = 1  # How often absent employees are checked for exit
+    ACTION_UPDATE_INTERVAL_SECONDS = 5  # Rewrite an unchanged action at most this often
+    RECENT_EVENTS_LIMIT = 256  # Entry/exit events kept for /api/recent_events
     
     # Training settings
     FACE_SAMPLES_PER_EMPLOYEE = 50
+    TRAINING_WORKERS = os.cpu_count() or 1  # Processes used to encode employee folders
     
     # Ensure required directories exist
     @staticmethod
@@ -1,11 +1,41 @@
 """
 Database models for Smart Office Monitoring System
 """
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from datetime import datetime
 
 db = SQLAlchemy()
 
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def format_duration(total_seconds):
+    """Format a whole number of seconds as 'Xh Ym'"""
+    hours, rem = divmod(int(total_seconds), 3600)
+    return f"{hours}h {rem // 60}m"
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune SQLite connections: WAL lets dashboard reads run alongside
+    attendance writes, and synchronous=NORMAL needs one fsync per commit
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+
 class Employee(db.Model):
     """Employee model for storing employee information"""
     __tablename__ = 'employees'
@@ -17,7 +47,7 @@ class Employee(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship with attendance
-    attendance_records = db.relationship('Attendance', backref='employee', lazy=True, cascade='all, delete-orphan')
+    attendance_records = db.relationship('Attendance', back_populates='employee', lazy=True, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Employee {self.name}>'
@@ -29,13 +59,18 @@ class Employee(db.Model):
             'name': self.name,
             'department': self.department,
             'face_data_path': self.face_data_path,
-            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            'created_at': self.created_at.strftime(DATETIME_FORMAT)
         }
 
 
 class Attendance(db.Model):
     """Attendance model for tracking employee entry/exit and actions"""
     __tablename__ = 'attendance'
+    __table_args__ = (
+        db.Index('ix_att_date_status', 'date', 'status'),
+        db.Index('ix_att_emp_date_status', 'employee_id', 'date', 'status'),
+        db.Index('ix_att_entry_time', 'entry_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
@@ -45,6 +80,8 @@ class Attendance(db.Model):
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
     status = db.Column(db.String(20), default='inside')  # inside or exited
     
+    employee = db.relationship('Employee', back_populates='attendance_records')
+    
     def __repr__(self):
         return f'<Attendance {self.employee_id} - {self.entry_time}>'
     
@@ -52,19 +89,17 @@ class Attendance(db.Model):
         """Convert attendance record to dictionary"""
         work_duration = None
         if self.exit_time:
-            duration = self.exit_time - self.entry_time
-            hours = duration.total_seconds() / 3600
-            work_duration = f"{int(hours)}h {int((hours % 1) * 60)}m"
+            work_duration = format_duration((self.exit_time - self.entry_time).total_seconds())
         
         return {
             'id': self.id,
             'employee_id': self.employee_id,
             'employee_name': self.employee.name if self.employee else 'Unknown',
             'department': self.employee.department if self.employee else 'Unknown',
-            'entry_time': self.entry_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'exit_time': self.exit_time.strftime('%Y-%m-%d %H:%M:%S') if self.exit_time else None,
+            'entry_time': self.entry_time.strftime(DATETIME_FORMAT),
+            'exit_time': self.exit_time.strftime(DATETIME_FORMAT) if self.exit_time else None,
             'action': self.action,
-            'date': self.date.strftime('%Y-%m-%d'),
+            'date': self.date.strftime(DATE_FORMAT),
             'status': self.status,
             'work_duration': work_duration
         }
@@ -1,13 +1,68 @@
 """
 Action detection module using pose estimation
 """
+import math
 import cv2
 import mediapipe as mp
 import numpy as np
+from config import Config
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional; fall back to plain Python math
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+
+@njit(cache=True, fastmath=True)
+def _angle(ax, ay, bx, by, cx, cy):
+    """Angle in degrees at point b formed by points a-b-c"""
+    r = math.atan2(cy - by, cx - bx) - math.atan2(ay - by, ax - bx)
+    a = abs(r * 180.0 / math.pi)
+    return 360.0 - a if a > 180.0 else a
+
+
+# Warm up once at import so JIT compilation isn't paid on the first frame
+_angle(0.0, 1.0, 0.0, 0.0, 1.0, 0.0)
+
+
+def _pose_landmark_enum():
+    """Resolve PoseLandmark across MediaPipe versions"""
+    try:
+        return mp.solutions.pose.PoseLandmark
+    except AttributeError:
+        import mediapipe.solutions as solutions
+        return solutions.pose.PoseLandmark
+
+
+# MediaPipe Pose landmark indices, resolved once instead of per frame
+_PoseLandmark = _pose_landmark_enum()
+_LSH = _PoseLandmark.LEFT_SHOULDER.value
+_LHIP = _PoseLandmark.LEFT_HIP.value
+_LKNEE = _PoseLandmark.LEFT_KNEE.value
+_LANK = _PoseLandmark.LEFT_ANKLE.value
+
+# Rows of the array returned by landmarks_to_array
+_ROW_SH, _ROW_HIP, _ROW_KNEE, _ROW_ANK = range(4)
+
+
+def landmarks_to_array(landmarks):
+    """
+    Snapshot the four landmarks classify_action uses (left shoulder, hip, knee,
+    ankle) into a (4, 2) array of (x, y), rows _ROW_SH.._ROW_ANK
+    """
+    sh, hip, knee, ank = landmarks[_LSH], landmarks[_LHIP], landmarks[_LKNEE], landmarks[_LANK]
+    return np.array(((sh.x, sh.y), (hip.x, hip.y), (knee.x, knee.y), (ank.x, ank.y)))
+
 
 class ActionDetector:
     """Detects basic actions using MediaPipe Pose"""
     
+    MAX_PEOPLE = 32  # person_id must be below this
+    
     def __init__(self):
         # Handle different MediaPipe versions
         try:
@@ -24,70 +79,75 @@ class ActionDetector:
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
-        self.previous_positions = {}
-        self.movement_threshold = 0.05
+        
+        # Drawing styles are constant, build them once instead of per frame
+        self._pose_connections = self.mp_pose.POSE_CONNECTIONS
+        self._lm_spec = self.mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2)
+        self._cn_spec = self.mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
+        # Last hip position per person_id, and whether it has been set
+        self._prev_pos = np.zeros((self.MAX_PEOPLE, 2), np.float64)
+        self._seen = np.zeros(self.MAX_PEOPLE, bool)
+        self.movement_threshold = 0.05  # Hip displacement per frame
+        self._rgb_buf = None
+        
+        # Temporal subsampling state for process_frame
+        self.pose_stride = max(1, Config.POSE_STRIDE)
+        # Movement is measured between inference frames, pose_stride frames apart,
+        # so the per-frame threshold is scaled to the same interval
+        self._thresh_sq = (self.movement_threshold * self.pose_stride) ** 2
+        self._frame_ctr = 0
+        self._last_action = 'unknown'
+        self._last_landmarks = None
     
     def calculate_angle(self, point1, point2, point3):
         """
         Calculate angle between three points
         Used for determining sitting/standing posture
         """
-        a = np.array([point1.x, point1.y])
-        b = np.array([point2.x, point2.y])
-        c = np.array([point3.x, point3.y])
-        
-        radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
-        angle = np.abs(radians * 180.0 / np.pi)
-        
-        if angle > 180.0:
-            angle = 360 - angle
-        
-        return angle
+        return _angle(point1.x, point1.y, point2.x, point2.y, point3.x, point3.y)
     
-    def detect_movement(self, landmarks, person_id):
+    def detect_movement(self, points, person_id):
         """
         Detect if person is moving (walking) or stationary
+        points: (4, 2) landmark array from landmarks_to_array
         """
+        # Negative ids would silently index another person's slot
+        if not 0 <= person_id < self.MAX_PEOPLE:
+            raise ValueError(f"person_id must be in [0, {self.MAX_PEOPLE}), got {person_id}")
+        
         # Use hip position as reference point
-        current_hip = landmarks[self.mp_pose.PoseLandmark.LEFT_HIP.value]
-        current_pos = (current_hip.x, current_hip.y)
+        x = float(points[_ROW_HIP, 0])
+        y = float(points[_ROW_HIP, 1])
         
-        if person_id in self.previous_positions:
-            prev_pos = self.previous_positions[person_id]
-            distance = np.sqrt((current_pos[0] - prev_pos[0])**2 + (current_pos[1] - prev_pos[1])**2)
-            
-            self.previous_positions[person_id] = current_pos
-            
-            if distance > self.movement_threshold:
-                return True  # Moving
-            else:
-                return False  # Stationary
-        else:
-            self.previous_positions[person_id] = current_pos
-            return False
+        prev = self._prev_pos[person_id]
+        moved = False
+        if self._seen[person_id]:
+            dx = x - prev[0]
+            dy = y - prev[1]
+            # Compare squared distance against squared threshold (no sqrt needed)
+            moved = (dx * dx + dy * dy) > self._thresh_sq
+        
+        prev[0] = x
+        prev[1] = y
+        self._seen[person_id] = True
+        return bool(moved)
     
-    def classify_action(self, landmarks, person_id=0):
+    def classify_action(self, points, person_id=0):
         """
         Classify action based on pose landmarks
+        points: (4, 2) landmark array from landmarks_to_array
         Returns: 'sitting', 'standing', 'walking', or 'idle'
         """
         try:
             # Get key landmarks
-            left_shoulder = landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER.value]
-            left_hip = landmarks[self.mp_pose.PoseLandmark.LEFT_HIP.value]
-            left_knee = landmarks[self.mp_pose.PoseLandmark.LEFT_KNEE.value]
-            left_ankle = landmarks[self.mp_pose.PoseLandmark.LEFT_ANKLE.value]
-            
-            right_shoulder = landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER.value]
-            right_hip = landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP.value]
-            right_knee = landmarks[self.mp_pose.PoseLandmark.RIGHT_KNEE.value]
+            (sh_x, sh_y), (hip_x, hip_y), (knee_x, knee_y), (ank_x, ank_y) = points.tolist()
             
             # Calculate angles
-            left_hip_angle = self.calculate_angle(left_shoulder, left_hip, left_knee)
-            left_knee_angle = self.calculate_angle(left_hip, left_knee, left_ankle)
+            left_hip_angle = _angle(sh_x, sh_y, hip_x, hip_y, knee_x, knee_y)
+            left_knee_angle = _angle(hip_x, hip_y, knee_x, knee_y, ank_x, ank_y)
             
             # Detect movement
-            is_moving = self.detect_movement(landmarks, person_id)
+            is_moving = self.detect_movement(points, person_id)
             
             # Classify based on angles and movement
             if is_moving:
@@ -105,34 +165,58 @@ class ActionDetector:
             print(f"Action classification error: {e}")
             return 'unknown'
     
+    def _draw(self, frame, pose_landmarks, action):
+        """Draw pose landmarks and the action label onto frame"""
+        self.mp_drawing.draw_landmarks(
+            frame,
+            pose_landmarks,
+            self._pose_connections,
+            self._lm_spec,
+            self._cn_spec
+        )
+        cv2.putText(frame, f"Action: {action.upper()}", (10, 60),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+    
+    def _annotate(self, frame, results):
+        """
+        Classify the action and draw it with the pose landmarks onto frame
+        Returns: action
+        """
+        action = 'unknown'
+        
+        if results.pose_landmarks:
+            # Classify action
+            points = landmarks_to_array(results.pose_landmarks.landmark)
+            action = self.classify_action(points)
+            
+            # Draw pose landmarks and action on frame
+            self._draw(frame, results.pose_landmarks, action)
+        
+        return action
+    
     def process_frame(self, frame):
         """
         Process frame and detect pose/action
+        Pose inference runs on every Config.POSE_STRIDE-th frame; frames in
+        between reuse the last landmarks and action
         Returns: (action, annotated_frame)
         """
         try:
-            # Convert to RGB for MediaPipe
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            self._frame_ctr += 1
+            if self._frame_ctr % self.pose_stride != 0 and self._last_landmarks is not None:
+                self._draw(frame, self._last_landmarks, self._last_action)
+                return self._last_action, frame
+            
+            # Convert to RGB for MediaPipe into a persistent buffer
+            if self._rgb_buf is None or self._rgb_buf.shape != frame.shape:
+                self._rgb_buf = np.empty_like(frame)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
             results = self.pose.process(rgb_frame)
             
-            action = 'unknown'
+            action = self._annotate(frame, results)
             
-            if results.pose_landmarks:
-                # Draw pose landmarks on frame
-                self.mp_drawing.draw_landmarks(
-                    frame,
-                    results.pose_landmarks,
-                    self.mp_pose.POSE_CONNECTIONS,
-                    self.mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    self.mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
-                )
-                
-                # Classify action
-                action = self.classify_action(results.pose_landmarks.landmark)
-                
-                # Display action on frame
-                cv2.putText(frame, f"Action: {action.upper()}", (10, 60),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            self._last_landmarks = results.pose_landmarks
+            self._last_action = action
             
             return action, frame
             
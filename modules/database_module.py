@@ -1,20 +1,40 @@
 """
 Database operations module for Smart Office Monitoring System
 """
-from database.models import db, Employee, Attendance
+import time
+from database.models import db, Employee, Attendance, format_duration
 from datetime import datetime, timedelta, date
 from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
+from config import Config
 
 class DatabaseManager:
     """Handles all database operations"""
     
+    # {employee_id: (last_written_action, monotonic_time)} used to coalesce update_action
+    _action_cache = {}
+    
+    # {employee_id: employee dict} so recognition doesn't query SQLite per frame
+    _employee_cache = {}
+    
     @staticmethod
     def init_db(app):
         """Initialize database with app context"""
         with app.app_context():
             db.create_all()
+            DatabaseManager.create_indexes()
+            DatabaseManager.refresh_employee_cache()
             print("Database initialized successfully!")
     
+    @staticmethod
+    def create_indexes():
+        """
+        Create any missing indexes on existing tables
+        db.create_all() only adds indexes when it creates the table itself
+        """
+        for index in Attendance.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    
     # ==================== Employee Operations ====================
     
     @staticmethod
@@ -28,7 +48,9 @@ class DatabaseManager:
             )
             db.session.add(employee)
             db.session.commit()
-            return {'success': True, 'employee': employee.to_dict()}
+            employee_dict = employee.to_dict()
+            DatabaseManager._employee_cache[employee.id] = employee_dict
+            return {'success': True, 'employee': employee_dict}
         except Exception as e:
             db.session.rollback()
             return {'success': False, 'error': str(e)}
@@ -47,6 +69,28 @@ class DatabaseManager:
         """Get employee by ID"""
         return Employee.query.get(employee_id)
     
+    @staticmethod
+    def get_cached_employee(employee_id):
+        """
+        Get employee dict by ID from the in-process cache
+        Never touches the database, so it is safe on threads without an app context
+        Returns: employee dict, or None if the employee isn't cached (e.g. deleted)
+        """
+        return DatabaseManager._employee_cache.get(employee_id)
+    
+    @staticmethod
+    def refresh_employee_cache():
+        """Reload the employee cache from the database"""
+        DatabaseManager._employee_cache = {emp.id: emp.to_dict() for emp in Employee.query.all()}
+    
+    @staticmethod
+    def clear_employee_cache(employee_id=None):
+        """Drop one employee (or all employees) from the cache"""
+        if employee_id is None:
+            DatabaseManager._employee_cache.clear()
+        else:
+            DatabaseManager._employee_cache.pop(employee_id, None)
+    
     @staticmethod
     def get_employee_by_name(name):
         """Get employee by name"""
@@ -60,6 +104,8 @@ class DatabaseManager:
             if employee:
                 db.session.delete(employee)
                 db.session.commit()
+                DatabaseManager._action_cache.pop(employee_id, None)
+                DatabaseManager.clear_employee_cache(employee_id)
                 return {'success': True}
             return {'success': False, 'error': 'Employee not found'}
         except Exception as e:
@@ -73,6 +119,7 @@ class DatabaseManager:
         """Log employee entry"""
         try:
             # Check if employee already has an active entry today
+            now = datetime.utcnow()
             today = date.today()
             existing = Attendance.query.filter(
                 and_(
@@ -84,25 +131,26 @@ class DatabaseManager:
             
             # Check cooldown period (prevent duplicate entries within X minutes)
             if existing:
-                time_diff = datetime.utcnow() - existing.entry_time
+                time_diff = now - existing.entry_time
                 if time_diff < timedelta(minutes=5):  # 5-minute cooldown
                     return {'success': False, 'error': 'Entry already logged recently'}
             
             # If exists and past cooldown, mark as exit first
             if existing:
-                existing.exit_time = datetime.utcnow()
+                existing.exit_time = now
                 existing.status = 'exited'
             
             # Create new entry
             attendance = Attendance(
                 employee_id=employee_id,
-                entry_time=datetime.utcnow(),
+                entry_time=now,
                 action=action,
                 date=today,
                 status='inside'
             )
             db.session.add(attendance)
             db.session.commit()
+            DatabaseManager._action_cache.pop(employee_id, None)
             return {'success': True, 'attendance': attendance.to_dict()}
         except Exception as e:
             db.session.rollback()
@@ -125,6 +173,7 @@ class DatabaseManager:
                 attendance.exit_time = datetime.utcnow()
                 attendance.status = 'exited'
                 db.session.commit()
+                DatabaseManager._action_cache.pop(employee_id, None)
                 return {'success': True, 'attendance': attendance.to_dict()}
             return {'success': False, 'error': 'No active entry found'}
         except Exception as e:
@@ -133,7 +182,16 @@ class DatabaseManager:
     
     @staticmethod
     def update_action(employee_id, action):
-        """Update the current action for an employee"""
+        """
+        Update the current action for an employee
+        Repeats of the last written action are skipped until
+        ACTION_UPDATE_INTERVAL_SECONDS have passed
+        """
+        now = time.monotonic()
+        cached = DatabaseManager._action_cache.get(employee_id)
+        if cached and cached[0] == action and now - cached[1] < Config.ACTION_UPDATE_INTERVAL_SECONDS:
+            return {'success': True}
+        
         try:
             today = date.today()
             attendance = Attendance.query.filter(
@@ -147,6 +205,7 @@ class DatabaseManager:
             if attendance:
                 attendance.action = action
                 db.session.commit()
+                DatabaseManager._action_cache[employee_id] = (action, now)
                 return {'success': True}
             return {'success': False, 'error': 'No active entry found'}
         except Exception as e:
@@ -158,7 +217,7 @@ class DatabaseManager:
         """Get all employees currently inside the office"""
         try:
             today = date.today()
-            current = Attendance.query.filter(
+            current = Attendance.query.options(joinedload(Attendance.employee)).filter(
                 and_(
                     Attendance.date == today,
                     Attendance.status == 'inside'
@@ -177,11 +236,31 @@ class DatabaseManager:
             elif isinstance(target_date, str):
                 target_date = datetime.strptime(target_date, '%Y-%m-%d').date()
             
-            attendance = Attendance.query.filter_by(date=target_date).all()
+            attendance = Attendance.query.options(joinedload(Attendance.employee)).filter_by(date=target_date).all()
             return [att.to_dict() for att in attendance]
         except Exception as e:
             return []
     
+    @staticmethod
+    def iter_daily_attendance(target_date=None, batch_size=500):
+        """
+        Stream attendance dicts for a specific date
+        Rows are fetched batch_size at a time instead of loading the whole day
+        """
+        try:
+            if target_date is None:
+                target_date = date.today()
+            elif isinstance(target_date, str):
+                target_date = datetime.strptime(target_date, '%Y-%m-%d').date()
+            
+            query = Attendance.query.options(joinedload(Attendance.employee)).filter_by(
+                date=target_date
+            ).yield_per(batch_size)
+            for att in query:
+                yield att.to_dict()
+        except Exception as e:
+            return
+    
     @staticmethod
     def get_employee_work_duration(employee_id, target_date=None):
         """Calculate total work duration for an employee on a specific date"""
@@ -201,11 +280,9 @@ class DatabaseManager:
             total_seconds = 0
             for record in records:
                 if record.exit_time:
-                    duration = record.exit_time - record.entry_time
-                    total_seconds += duration.total_seconds()
+                    total_seconds += int((record.exit_time - record.entry_time).total_seconds())
             
-            hours = total_seconds / 3600
-            return f"{int(hours)}h {int((hours % 1) * 60)}m"
+            return format_duration(total_seconds)
         except Exception as e:
             return "0h 0m"
     
@@ -213,7 +290,9 @@ class DatabaseManager:
     def get_recent_activity(limit=10):
         """Get recent attendance activity"""
         try:
-            recent = Attendance.query.order_by(Attendance.entry_time.desc()).limit(limit).all()
+            recent = Attendance.query.options(joinedload(Attendance.employee)).order_by(
+                Attendance.entry_time.desc()
+            ).limit(limit).all()
             return [att.to_dict() for att in recent]
         except Exception as e:
             return []
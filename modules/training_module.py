@@ -3,18 +3,158 @@ Training module for face recognition model
 """
 import cv2
 import os
+import multiprocessing
 import numpy as np
 import pickle
-import face_recognition
+import dlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import cached_property, partial
+from face_recognition import api as fr_api
 from config import Config
 
+# Number of face images passed to the dlib encoder per call
+ENCODE_BATCH_SIZE = 64
+
+# Threads reading and decoding images ahead of the encoder; inside pool
+# workers every core already runs an encoder, so one prefetch thread is enough
+IO_THREADS = 8
+WORKER_IO_THREADS = 1
+
+# Thread-count variables read by the BLAS/OpenMP runtimes when they are loaded
+_THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+@contextmanager
+def _single_threaded_worker_env():
+    """
+    Set the BLAS/OpenMP thread counts to 1 while worker processes are spawned
+    They only take effect before the libraries load, so they have to be in the
+    environment the workers inherit rather than set from inside a worker
+    The server's own threads never read these variables after startup (their
+    libraries are already loaded), so the brief override doesn't affect them
+    """
+    saved = {name: os.environ.get(name) for name in _THREAD_ENV_VARS}
+    os.environ.update({name: '1' for name in _THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _init_worker():
+    """Keep OpenCV in each training worker single-threaded to avoid oversubscribing cores"""
+    cv2.setNumThreads(1)
+
+
+def _encode_batch(rgb_imgs, shapes):
+    """
+    Compute 128-d descriptors for a batch of images in one dlib call
+    shapes: one dlib.full_object_detections (single face) per image
+    """
+    descriptors = fr_api.face_encoder.compute_face_descriptor(rgb_imgs, shapes, 1)
+    return [np.asarray(faces[0], dtype=np.float32) for faces in descriptors]
+
+
+def _read_image(image_path):
+    """Read and decode one image file; returns None if it can't be read"""
+    try:
+        with open(image_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # Empty or corrupt files are skipped like cv2.imread skipped them
+    if not data:
+        return None
+    try:
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None
+
+
+def _encode_folder(folder_path, io_threads=IO_THREADS):
+    """
+    Encode every face image in one employee folder
+    Runs in a worker process; returns an (N, 128) float32 array
+    """
+    encodings = []
+    
+    # Images with a detected face, waiting to be encoded as one batch
+    rgb_imgs = []
+    shapes = []
+    
+    image_paths = [os.path.join(folder_path, image_name)
+                   for image_name in os.listdir(folder_path) if image_name.endswith('.jpg')]
+    
+    # Read all face images in the folder; file reads and JPEG decoding run on
+    # a thread pool ahead of detection/encoding in this thread
+    with ThreadPoolExecutor(max_workers=io_threads) as io_pool:
+        for bgr_img in io_pool.map(_read_image, image_paths):
+            if bgr_img is None:
+                continue
+            
+            rgb_img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
+            detections = fr_api.face_detector(rgb_img, 1)
+            if not detections:
+                continue
+            
+            faces = dlib.full_object_detections()
+            faces.append(fr_api.pose_predictor_5_point(rgb_img, detections[0]))
+            rgb_imgs.append(rgb_img)
+            shapes.append(faces)
+            
+            if len(rgb_imgs) >= ENCODE_BATCH_SIZE:
+                encodings.extend(_encode_batch(rgb_imgs, shapes))
+                rgb_imgs, shapes = [], []
+    
+    if rgb_imgs:
+        encodings.extend(_encode_batch(rgb_imgs, shapes))
+    
+    return np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+
+
+def compute_centroids(encodings, labels):
+    """
+    Collapse per-image encodings into one L2-normalized centroid per employee
+    Returns: (centroids, unique_labels)
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    labels = np.asarray(labels)
+    unique_labels = np.unique(labels)
+    
+    centroids = np.stack([encodings[labels == label].mean(axis=0) for label in unique_labels])
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids, unique_labels
+
+
+def prepare_recognizer(data):
+    """
+    Make sure a loaded/trained model dict has float32 per-employee centroids
+    Models saved before centroids were introduced are converted on load
+    """
+    if 'centroids' not in data:
+        data['centroids'], data['labels'] = compute_centroids(data.pop('encodings'), data['labels'])
+    # Contiguous float32 so matching runs as single-precision BLAS without conversion
+    data['centroids'] = np.ascontiguousarray(data['centroids'], dtype=np.float32)
+    return data
+
+
 class FaceTrainer:
     """Handles training of face recognition model"""
     
     def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.recognizer = None
-        self.model_path = os.path.join(Config.TRAINED_MODELS_FOLDER, 'face_encodings.pkl')
+        self.model_path = os.path.join(Config.TRAINED_MODELS_FOLDER, 'face_encodings.npz')
+        # Pickle format written by older versions; still read when no .npz exists
+        self.legacy_model_path = os.path.join(Config.TRAINED_MODELS_FOLDER, 'face_encodings.pkl')
+    
+    @cached_property
+    def face_cascade(self):
+        """Haar cascade for sample collection, loaded on first use"""
+        return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
     
     def collect_face_samples(self, employee_id, employee_name, num_samples=50):
         """
@@ -43,15 +183,19 @@ class FaceTrainer:
                 if not ret:
                     continue
                 
+                # Detect on a half-size grayscale copy; boxes are mapped back to
+                # full resolution so the saved crops keep their quality
                 gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                small = cv2.resize(gray, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+                min_w, min_h = Config.FACE_DETECTION_MIN_SIZE
                 faces = self.face_cascade.detectMultiScale(
-                    gray,
+                    small,
                     scaleFactor=Config.FACE_DETECTION_SCALE_FACTOR,
                     minNeighbors=Config.FACE_DETECTION_MIN_NEIGHBORS,
-                    minSize=Config.FACE_DETECTION_MIN_SIZE
+                    minSize=(max(1, min_w // 2), max(1, min_h // 2))
                 )
                 
-                for (x, y, w, h) in faces:
+                for (x, y, w, h) in (faces * 2 if len(faces) else faces):
                     count += 1
                     # Save face image
                     face_img = frame[y:y+h, x:x+w]
@@ -89,14 +233,16 @@ class FaceTrainer:
     def prepare_training_data(self):
         """
         Prepare training data from all employee face folders
-        Returns: faces array, labels array, and label-to-name mapping
+        Folders are encoded in parallel, one folder per worker task
+        Returns: encodings array, labels array, and label-to-name mapping
         """
         encodings = []
         labels = []
         label_names = {}
         
         try:
-            # Iterate through all employee folders
+            # Collect all employee folders
+            folders = []
             for folder_name in os.listdir(Config.UPLOAD_FOLDER):
                 folder_path = os.path.join(Config.UPLOAD_FOLDER, folder_name)
                 
@@ -109,26 +255,32 @@ class FaceTrainer:
                 except:
                     continue
                 
-                # Read all face images in the folder
-                for image_name in os.listdir(folder_path):
-                    if not image_name.endswith('.jpg'):
-                        continue
-                    
-                    image_path = os.path.join(folder_path, image_name)
-                    bgr_img = cv2.imread(image_path)
-                    if bgr_img is None:
-                        continue
-
-                    rgb_img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
-                    face_encs = face_recognition.face_encodings(rgb_img)
-                    if not face_encs:
-                        continue
-
-                    encodings.append(face_encs[0])
-                    labels.append(employee_id)
-                    label_names[employee_id] = folder_name
+                folders.append((employee_id, folder_name, folder_path))
             
-            return encodings, labels, label_names
+            paths = [folder_path for _, _, folder_path in folders]
+            workers = min(Config.TRAINING_WORKERS, len(folders))
+            if workers > 1:
+                # Spawn fresh workers: forking the multithreaded server process can deadlock.
+                # multiprocessing.Pool starts every worker in its constructor, so the
+                # environment override only lasts for the launch itself
+                ctx = multiprocessing.get_context('spawn')
+                with _single_threaded_worker_env():
+                    pool = ctx.Pool(workers, initializer=_init_worker)
+                with pool:
+                    results = pool.map(partial(_encode_folder, io_threads=WORKER_IO_THREADS), paths, chunksize=1)
+            else:
+                results = [_encode_folder(path) for path in paths]
+            
+            for (employee_id, folder_name, _), folder_encodings in zip(folders, results):
+                if len(folder_encodings) == 0:
+                    continue
+                encodings.append(folder_encodings)
+                labels.extend([employee_id] * len(folder_encodings))
+                label_names[employee_id] = folder_name
+            
+            if not encodings:
+                return [], [], {}
+            return np.concatenate(encodings), labels, label_names
             
         except Exception as e:
             print(f"Error preparing training data: {e}")
@@ -147,16 +299,17 @@ class FaceTrainer:
             
             print(f"Training model with {len(encodings)} face samples from {len(set(labels))} employees...")
 
+            # One normalized centroid per employee keeps the match matrix small
+            centroids, unique_labels = compute_centroids(encodings, labels)
             data = {
-                'encodings': np.array(encodings),
-                'labels': np.array(labels),
+                'centroids': centroids,
+                'labels': unique_labels,
                 'label_names': label_names
             }
 
-            with open(self.model_path, 'wb') as f:
-                pickle.dump(data, f)
+            self._save_model(data)
 
-            self.recognizer = data
+            self.recognizer = prepare_recognizer(data)
             
             return {
                 'success': True,
@@ -168,6 +321,18 @@ class FaceTrainer:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    def _save_model(self, data):
+        """Write the model as plain numpy arrays (no pickle)"""
+        label_names = data['label_names']
+        with open(self.model_path, 'wb') as f:
+            np.savez(
+                f,
+                centroids=np.asarray(data['centroids'], dtype=np.float32),
+                labels=np.asarray(data['labels']),
+                label_name_ids=np.asarray(list(label_names.keys()), dtype=np.int64),
+                label_name_values=np.asarray(list(label_names.values()), dtype=str)
+            )
+    
     def load_model(self):
         """
         Load existing trained model
@@ -175,8 +340,17 @@ class FaceTrainer:
         """
         try:
             if os.path.exists(self.model_path):
-                with open(self.model_path, 'rb') as f:
-                    self.recognizer = pickle.load(f)
+                with np.load(self.model_path, allow_pickle=False) as npz:
+                    self.recognizer = prepare_recognizer({
+                        'centroids': npz['centroids'],
+                        'labels': npz['labels'],
+                        'label_names': dict(zip(npz['label_name_ids'].tolist(),
+                                                npz['label_name_values'].tolist()))
+                    })
+                return True
+            if os.path.exists(self.legacy_model_path):
+                with open(self.legacy_model_path, 'rb') as f:
+                    self.recognizer = prepare_recognizer(pickle.load(f))
                 return True
             return False
         except Exception as e:
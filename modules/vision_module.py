@@ -1,32 +1,141 @@
 """
 Vision module for face detection and recognition
 """
+import atexit
 import cv2
+import logging
+import os
+import queue
+import sys
 import threading
 import time
 import numpy as np
+import dlib
 import face_recognition
-from datetime import datetime, timedelta
+from face_recognition import api as fr_api
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from config import Config
+from database.models import DATETIME_FORMAT
 from modules.database_module import DatabaseManager
 
+# Per-employee presence status stored in VisionSystem._status
+_STATUS_NONE = 0
+_STATUS_INSIDE = 1
+_STATUS_EXITED = 2
+
+def _box_iou(a, b):
+    """IoU matrix between (N, 4) and (M, 4) arrays of (top, right, bottom, left) boxes"""
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
 class VisionSystem:
     """Handles real-time face detection and recognition"""
     
-    def __init__(self, recognizer=None):
+    def __init__(self, recognizer=None, app=None):
         self.recognizer = recognizer
+        self.app = app  # Flask app, for database calls from the monitoring threads
         self.camera = None
         self.is_running = False
         self.current_frame = None
+        self.frame_id = 0  # Incremented every time current_frame is replaced
         self.lock = threading.Lock()
+        self.frame_ready = threading.Condition(self.lock)
+        
+        # Monitoring session: stop signal and worker threads, replaced on every start
+        self._control_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        
+        # JPEG of the latest frame, shared by every /video_feed viewer
+        self._jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, Config.STREAM_JPEG_QUALITY,
+                             cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+        self._jpeg_lock = threading.Lock()
+        self._jpeg_id = None
+        self._jpeg = None
+        
+        # Most recent entry/exit events for the dashboard
+        self._events = deque(maxlen=Config.RECENT_EVENTS_LIMIT)
+        
+        # Events are also logged through a queue; a listener thread started with each
+        # monitoring session writes them to stdout, off the detection loop. The logger
+        # is private to this instance, so no global logging state is touched
+        self._event_queue = queue.SimpleQueue()
+        self._event_logger = logging.Logger(f'{__name__}.events')
+        self._event_logger.addHandler(QueueHandler(self._event_queue))
+        self._event_listener = None
+        
+        # SSD face detector (None -> fall back to dlib HOG)
+        self.face_net = self._load_face_net()
+        
+        # Latest decoded frame handed from the capture thread to the processing thread
+        self._frame_q = queue.Queue(maxsize=1)
+        
+        # Faces recognized in the previous processed frame:
+        # [(box, employee_id, confidence, frame index of last encoding), ...]
+        self._prev_tracks = []
+        self._track_frame = 0
+        
+        # Reused detection-size buffers (resized BGR frame and its RGB copy)
+        self._small_buf = None
+        self._rgb_buf = None
         
-        # Track last seen times to implement entry/exit logic
-        self.last_seen = {}  # {employee_id: datetime}
-        self.current_status = {}  # {employee_id: 'inside' or 'exited'}
+        # Entry/exit state as parallel arrays indexed by a dense per-employee slot;
+        # shared by the processing thread and the exit-check thread under _track_lock
+        self._track_lock = threading.Lock()
+        self._track_index = {}  # {employee_id: slot}
+        self._track_ids = np.zeros(0, np.int64)  # slot -> employee_id
+        self._seen = np.zeros(0, bool)  # seen at least once
+        self._last_seen_s = np.zeros(0, np.float64)  # unix time last seen
+        self._status = np.zeros(0, np.int8)  # _STATUS_* value
+        if recognizer is not None:
+            self.set_recognizer(recognizer)
+    
+    @staticmethod
+    def _load_face_net():
+        """Load the OpenCV DNN face detector if its model files are present"""
+        if not (os.path.exists(Config.FACE_DNN_PROTOTXT) and os.path.exists(Config.FACE_DNN_MODEL)):
+            print("DNN face detector model not found, using HOG face detection")
+            return None
+        try:
+            net = cv2.dnn.readNetFromCaffe(Config.FACE_DNN_PROTOTXT, Config.FACE_DNN_MODEL)
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            return net
+        except Exception as e:
+            print(f"Error loading DNN face detector: {e}")
+            return None
     
     def set_recognizer(self, recognizer):
         """Set the trained recognizer"""
         self.recognizer = recognizer
+        self._prev_tracks = []
+        # Reserve a tracking slot for every known employee up front
+        if isinstance(recognizer, dict) and recognizer.get('labels') is not None:
+            with self._track_lock:
+                for label in recognizer['labels']:
+                    self._track_slot(int(label))
+    
+    def _track_slot(self, employee_id):
+        """Dense array index for employee_id, adding a slot if needed (call with _track_lock held)"""
+        idx = self._track_index.get(employee_id)
+        if idx is None:
+            idx = len(self._track_ids)
+            self._track_index[employee_id] = idx
+            self._track_ids = np.append(self._track_ids, employee_id)
+            self._seen = np.append(self._seen, False)
+            self._last_seen_s = np.append(self._last_seen_s, 0.0)
+            self._status = np.append(self._status, np.int8(_STATUS_NONE))
+        return idx
     
     def start_camera(self):
         """Initialize and start camera"""
@@ -47,114 +156,266 @@ class VisionSystem:
     
     def stop_camera(self):
         """Stop camera and cleanup"""
-        self.is_running = False
-        if self.camera:
-            self.camera.release()
-            self.camera = None
+        with self._control_lock:
+            self.is_running = False
+            self._stop_event.set()
+            with self.frame_ready:
+                self.frame_ready.notify_all()
+            
+            # The camera can only be released once no thread is inside grab()/retrieve()
+            current = threading.current_thread()
+            for thread in self._threads:
+                if thread is not current:
+                    thread.join()
+            self._threads = []
+            
+            if self.camera:
+                self.camera.release()
+                self.camera = None
+            
+            self._stop_event_listener()
+    
+    def _start_event_listener(self):
+        """Start the thread that writes queued events to stdout"""
+        if self._event_listener is None:
+            self._event_listener = QueueListener(self._event_queue, logging.StreamHandler(sys.stdout))
+            self._event_listener.start()
+            # Flush queued events even if the process exits while monitoring
+            atexit.register(self._stop_event_listener)
+    
+    def _stop_event_listener(self):
+        """Write out any queued events and stop the listener thread"""
+        if self._event_listener is not None:
+            atexit.unregister(self._stop_event_listener)
+            self._event_listener.stop()
+            self._event_listener = None
+    
+    def _to_rgb(self, frame):
+        """
+        BGR -> RGB into a reused buffer; dlib needs a contiguous RGB array,
+        so a [:, :, ::-1] view can't be passed instead
+        """
+        if self._rgb_buf is None or self._rgb_buf.shape != frame.shape:
+            self._rgb_buf = np.empty_like(frame)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
     
     def detect_faces(self, frame):
         """
-        Detect faces in frame
-        Returns: (face_locations, rgb_frame)
-        face_locations format: (top, right, bottom, left)
+        Detect faces on a copy of frame downscaled to Config.DETECTION_FRAME_WIDTH
+        Returns: (face_locations, rgb_frame, scale)
+        face_locations format: (top, right, bottom, left) in rgb_frame
+        coordinates; divide by scale to map them back onto frame
         """
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame, model='hog')
-        return face_locations, rgb_frame
+        scale = min(1.0, Config.DETECTION_FRAME_WIDTH / frame.shape[1])
+        if scale < 1.0:
+            size = (round(frame.shape[1] * scale), round(frame.shape[0] * scale))
+            if self._small_buf is None or self._small_buf.shape[:2] != (size[1], size[0]):
+                self._small_buf = np.empty((size[1], size[0], 3), np.uint8)
+            frame = cv2.resize(frame, size, dst=self._small_buf, interpolation=cv2.INTER_AREA)
+        
+        if self.face_net is None:
+            rgb_frame = self._to_rgb(frame)
+            face_locations = face_recognition.face_locations(rgb_frame, model='hog')
+            return face_locations, rgb_frame, scale
+        
+        h, w = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300), (104.0, 177.0, 123.0),
+                                     swapRB=False, crop=False)
+        self.face_net.setInput(blob)
+        detections = self.face_net.forward()[0, 0]
+        
+        # Rows are [_, _, confidence, x1, y1, x2, y2] with normalized coordinates
+        detections = detections[detections[:, 2] >= Config.FACE_DNN_CONFIDENCE]
+        boxes = np.clip(detections[:, 3:7] * (w, h, w, h), 0, (w - 1, h - 1, w - 1, h - 1)).astype(int)
+        face_locations = [(int(y1), int(x2), int(y2), int(x1))
+                          for x1, y1, x2, y2 in boxes if x2 > x1 and y2 > y1]
+        
+        # RGB is only needed by the encoder
+        rgb_frame = self._to_rgb(frame) if face_locations else None
+        return face_locations, rgb_frame, scale
     
     def recognize_face(self, rgb_frame, face_location):
         """
         Recognize face using trained model
         Returns: (employee_id, confidence) or (None, None)
         """
-        if self.recognizer is None:
-            return None, None
+        return self.recognize_faces(rgb_frame, [face_location])[0]
+    
+    def recognize_faces(self, rgb_frame, face_locations):
+        """
+        Recognize all faces in a frame with a single encoder call
+        Returns: list of (employee_id, confidence) or (None, None), one per location
+        """
+        results = [(None, None)] * len(face_locations)
+        if self.recognizer is None or not face_locations:
+            return results
 
         try:
-            face_encs = face_recognition.face_encodings(rgb_frame, [face_location])
-            if not face_encs:
-                return None, None
-
-            face_encoding = face_encs[0]
-            known_encodings = self.recognizer.get('encodings') if isinstance(self.recognizer, dict) else None
+            known_encodings = self.recognizer.get('centroids') if isinstance(self.recognizer, dict) else None
             known_labels = self.recognizer.get('labels') if isinstance(self.recognizer, dict) else None
 
             if known_encodings is None or known_labels is None or len(known_encodings) == 0:
-                return None, None
+                return results
+
+            queries = self._encode_faces(rgb_frame, face_locations)
+            if len(queries) != len(face_locations):
+                return results
 
-            distances = face_recognition.face_distance(known_encodings, face_encoding)
-            if distances.size == 0:
-                return None, None
+            # Normalize all queries in float32 (matching the centroids) so the
+            # product stays single precision without upcasting the matrix
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
 
-            best_idx = int(np.argmin(distances))
-            best_distance = float(distances[best_idx])
+            # Cosine similarity of every face against every centroid in one GEMM;
+            # for unit vectors ||a - b|| = sqrt(2 - 2 * a.b)
+            sims = queries @ known_encodings.T
+            best_idx = sims.argmax(axis=1)
+            best_sims = sims[np.arange(len(best_idx)), best_idx]
+            best_distances = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * best_sims))
 
-            if best_distance <= getattr(Config, 'FACE_RECOGNITION_TOLERANCE', 0.6):
-                return int(known_labels[best_idx]), best_distance
+            tolerance = getattr(Config, 'FACE_RECOGNITION_TOLERANCE', 0.6)
+            for i, (idx, distance) in enumerate(zip(best_idx, best_distances)):
+                distance = float(distance)
+                if distance <= tolerance:
+                    results[i] = (int(known_labels[idx]), distance)
+                else:
+                    results[i] = (None, distance)
 
-            return None, best_distance
+            return results
         except Exception as e:
             print(f"Recognition error: {e}")
-            return None, None
+            return [(None, None)] * len(face_locations)
+    
+    @staticmethod
+    def _encode_faces(rgb_frame, face_locations):
+        """
+        Compute 128-d descriptors for every face in a frame with one dlib call,
+        so a CUDA build of dlib runs them as a single batch on the GPU
+        Returns: (N, 128) float32 array
+        """
+        faces = dlib.full_object_detections()
+        for top, right, bottom, left in face_locations:
+            faces.append(fr_api.pose_predictor_5_point(rgb_frame, dlib.rectangle(left, top, right, bottom)))
+        
+        descriptors = fr_api.face_encoder.compute_face_descriptor(rgb_frame, faces, 1)
+        return np.asarray([np.asarray(d) for d in descriptors], dtype=np.float32).reshape(-1, 128)
+    
+    def recognize_tracked(self, rgb_frame, face_locations):
+        """
+        Recognize faces, reusing the identity of a face recognized in the previous
+        frame when its box overlaps by more than Config.TRACK_IOU_THRESHOLD
+        Tracked faces are re-encoded every Config.TRACK_REVERIFY_FRAMES frames
+        Returns: list of (employee_id, confidence) or (None, None), one per location
+        """
+        self._track_frame += 1
+        frame_idx = self._track_frame
+        matches = [None] * len(face_locations)
+        verified = [frame_idx] * len(face_locations)
+        
+        tracks = self._prev_tracks
+        if face_locations and tracks:
+            iou = _box_iou(np.asarray(face_locations, np.float32),
+                           np.asarray([t[0] for t in tracks], np.float32))
+            used = set()
+            for i, j in enumerate(iou.argmax(axis=1)):
+                _, employee_id, confidence, verified_at = tracks[j]
+                if (j not in used and iou[i, j] > Config.TRACK_IOU_THRESHOLD
+                        and frame_idx - verified_at < Config.TRACK_REVERIFY_FRAMES):
+                    used.add(j)
+                    matches[i] = (employee_id, confidence)
+                    verified[i] = verified_at
+        
+        # Encode only the faces that couldn't be carried over
+        pending = [i for i, match in enumerate(matches) if match is None]
+        if pending:
+            for i, match in zip(pending, self.recognize_faces(rgb_frame, [face_locations[i] for i in pending])):
+                matches[i] = match
+        
+        self._prev_tracks = [(face_locations[i], employee_id, confidence, verified[i])
+                             for i, (employee_id, confidence) in enumerate(matches)
+                             if employee_id is not None]
+        return matches
     
     def handle_detection(self, employee_id, employee_name):
         """
         Handle entry/exit logic when a face is detected
         """
-        current_time = datetime.utcnow()
+        current_time = time.time()
+        cooldown = Config.ENTRY_EXIT_COOLDOWN_MINUTES * 60
         
-        # Check if this is a new detection or re-detection
-        if employee_id in self.last_seen:
-            time_diff = current_time - self.last_seen[employee_id]
+        # Decide on the transition under the lock; the database write happens outside it
+        with self._track_lock:
+            idx = self._track_slot(employee_id)
             
-            # If seen within cooldown period, just update last_seen
-            if time_diff < timedelta(minutes=Config.ENTRY_EXIT_COOLDOWN_MINUTES):
-                self.last_seen[employee_id] = current_time
-                return None
-            
-            # If not seen for a while, this is a re-entry
-            if employee_id in self.current_status and self.current_status[employee_id] == 'exited':
-                # Log new entry
-                result = DatabaseManager.log_entry(employee_id)
-                if result['success']:
-                    self.current_status[employee_id] = 'inside'
-                    self.last_seen[employee_id] = current_time
-                    return f"{employee_name} has entered the office"
-        else:
-            # First time seeing this employee today
+            # Check if this is a new detection or re-detection
+            if self._seen[idx]:
+                # If seen within cooldown period, just update last_seen
+                if current_time - self._last_seen_s[idx] < cooldown:
+                    self._last_seen_s[idx] = current_time
+                    return None
+                
+                # If not seen for a while, this is a re-entry only if they had exited
+                if self._status[idx] != _STATUS_EXITED:
+                    self._last_seen_s[idx] = current_time
+                    return None
+        
+        # First time seeing this employee today, or a re-entry: log new entry
+        with self._db_context():
             result = DatabaseManager.log_entry(employee_id)
+        
+        with self._track_lock:
+            # Update last seen time
+            self._seen[idx] = True
+            self._last_seen_s[idx] = current_time
             if result['success']:
-                self.current_status[employee_id] = 'inside'
-                self.last_seen[employee_id] = current_time
+                self._status[idx] = _STATUS_INSIDE
                 return f"{employee_name} has entered the office"
-        
-        # Update last seen time
-        self.last_seen[employee_id] = current_time
         return None
     
     def check_exits(self):
         """
         Check for employees who haven't been seen recently and mark as exited
         """
-        current_time = datetime.utcnow()
-        exit_threshold = timedelta(minutes=Config.ENTRY_EXIT_COOLDOWN_MINUTES)
+        current_time = time.time()
+        exit_threshold = Config.ENTRY_EXIT_COOLDOWN_MINUTES * 60
         
-        for employee_id, last_time in list(self.last_seen.items()):
-            if employee_id in self.current_status and self.current_status[employee_id] == 'inside':
-                time_diff = current_time - last_time
-                
-                # If not seen for threshold time, mark as exited
-                if time_diff > exit_threshold:
-                    result = DatabaseManager.log_exit(employee_id)
-                    if result['success']:
-                        self.current_status[employee_id] = 'exited'
-                        employee = DatabaseManager.get_employee_by_id(employee_id)
-                        if employee:
-                            print(f"{employee.name} has exited the office")
+        # One vectorized pass finds everyone inside but not seen for the threshold time
+        with self._track_lock:
+            exited = np.flatnonzero(
+                (self._status == _STATUS_INSIDE) & ((current_time - self._last_seen_s) > exit_threshold)
+            )
+            employee_ids = self._track_ids[exited].tolist()
+        
+        # Log exits without holding the lock so the frame loop never waits on SQLite
+        for idx, employee_id in zip(exited, employee_ids):
+            with self._track_lock:
+                # Skip anyone seen again since the scan; marking them exited in the
+                # same critical section means a sighting during the write below
+                # is handled as a re-entry rather than lost
+                if (self._status[idx] != _STATUS_INSIDE
+                        or time.time() - self._last_seen_s[idx] <= exit_threshold):
+                    continue
+                self._status[idx] = _STATUS_EXITED
+            
+            with self._db_context():
+                result = DatabaseManager.log_exit(employee_id)
+            if not result['success']:
+                with self._track_lock:
+                    # Undo unless a re-entry already changed the status
+                    if self._status[idx] == _STATUS_EXITED:
+                        self._status[idx] = _STATUS_INSIDE
+                continue
+            
+            employee = DatabaseManager.get_cached_employee(employee_id)
+            if employee:
+                self._record_event(f"{employee['name']} has exited the office")
+    
+    def _db_context(self):
+        """Flask app context for DatabaseManager calls made from the monitoring threads"""
+        return self.app.app_context() if self.app is not None else nullcontext()
     
     def process_frame(self):
         """
-        Process a single frame: detect and recognize faces
+        Read and process a single frame: detect and recognize faces
         Returns: processed frame with annotations
         """
         if not self.camera or not self.is_running:
@@ -164,58 +425,81 @@ class VisionSystem:
         if not ret:
             return None
         
-        # Detect faces
-        face_locations, rgb_frame = self.detect_faces(frame)
+        return self._process_decoded(frame)
+    
+    def _process_decoded(self, frame):
+        """
+        Detect and recognize faces in an already decoded frame
+        The annotated frame becomes current_frame and must not be modified afterwards
+        Returns: processed frame with annotations
+        """
+        # Bind hot-loop callables and constants to locals
+        rect = cv2.rectangle
+        put = cv2.putText
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        get_employee = DatabaseManager.get_cached_employee
+        
+        # Detect faces (on a downscaled copy)
+        face_locations, rgb_frame, scale = self.detect_faces(frame)
+        
+        # Recognize faces on the detection-sized image, skipping ones tracked from the last frame
+        matches = self.recognize_tracked(rgb_frame, face_locations)
         
         messages = []
         
-        for (top, right, bottom, left) in face_locations:
-            # Recognize face
-            employee_id, confidence = self.recognize_face(rgb_frame, (top, right, bottom, left))
+        for face_location, (employee_id, confidence) in zip(face_locations, matches):
+            # Map the box back to full-frame coordinates for drawing
+            top, right, bottom, left = [int(v / scale) for v in face_location]
             
-            if employee_id is not None:
-                # Get employee details
-                employee = DatabaseManager.get_employee_by_id(employee_id)
+            employee = get_employee(employee_id) if employee_id is not None else None
+            
+            if employee:
+                # Handle entry/exit
+                message = self.handle_detection(employee_id, employee['name'])
+                if message:
+                    messages.append(message)
                 
-                if employee:
-                    # Handle entry/exit
-                    message = self.handle_detection(employee_id, employee.name)
-                    if message:
-                        messages.append(message)
-                    
-                    # Draw green rectangle for recognized face
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                    
-                    # Display name and confidence
-                    label = f"{employee.name} ({confidence:.2f})"
-                    cv2.putText(frame, label, (left, top-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                else:
-                    # Unknown employee ID
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                    cv2.putText(frame, "Unknown", (left, top-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                # Draw green rectangle for recognized face
+                rect(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+                
+                # Display name and confidence
+                label = f"{employee['name']} ({confidence:.2f})"
+                put(frame, label, (left, top-10), font, 0.6, (0, 255, 0), 2)
             else:
-                # Unrecognized face
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                cv2.putText(frame, "Unknown", (left, top-10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                # Unrecognized face or unknown employee ID
+                rect(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+                put(frame, "Unknown", (left, top-10), font, 0.6, (0, 0, 255), 2)
         
         # Add timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cv2.putText(frame, timestamp, (10, 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        timestamp = datetime.now().strftime(DATETIME_FORMAT)
+        put(frame, timestamp, (10, 30), font, 0.7, (255, 255, 255), 2)
         
-        # Store current frame
+        # Publish the frame by swapping the reference; every capture decodes into a
+        # fresh array and it is not drawn on after this point, so no copy is needed
         with self.lock:
-            self.current_frame = frame.copy()
+            self.current_frame = frame
+            self.frame_id += 1
+            self.frame_ready.notify_all()
         
-        # Print messages
         for msg in messages:
-            print(msg)
+            self._record_event(msg, timestamp)
         
         return frame
     
+    def _record_event(self, msg, timestamp=None):
+        """Add an entry/exit message to the recent events and log it in the background"""
+        if timestamp is None:
+            timestamp = datetime.now().strftime(DATETIME_FORMAT)
+        self._events.append({'ts': timestamp, 'msg': msg})
+        self._event_logger.info(msg)
+    
+    def get_recent_events(self):
+        """
+        Get recent entry/exit events, newest first
+        Returns: list of {'ts': str, 'msg': str}
+        """
+        return list(reversed(self._events))
+    
     def get_current_frame(self):
         """Get the current processed frame"""
         with self.lock:
@@ -223,18 +507,101 @@ class VisionSystem:
                 return self.current_frame.copy()
         return None
     
-    def run_monitoring(self):
-        """Run continuous monitoring in a loop"""
-        while self.is_running:
-            self.process_frame()
+    def get_jpeg(self, last_id=None, timeout=1.0):
+        """
+        Wait for a frame newer than last_id and return it JPEG-encoded
+        Each frame is encoded once and the bytes are shared by all viewers
+        Returns: (frame_id, jpeg_bytes) or (last_id, None) on timeout/stop
+        """
+        with self.frame_ready:
+            # Also wait while no frame has been published yet (camera still opening)
+            self.frame_ready.wait_for(
+                lambda: (self.frame_id != last_id and self.current_frame is not None)
+                or not self.is_running, timeout
+            )
+            if self.current_frame is None or self.frame_id == last_id:
+                return last_id, None
+            # current_frame is replaced, never mutated, so it can be encoded outside the lock
+            frame_id, frame = self.frame_id, self.current_frame
+        
+        with self._jpeg_lock:
+            if self._jpeg_id != frame_id:
+                ret, buffer = cv2.imencode('.jpg', frame, self._jpeg_params)
+                if not ret:
+                    return last_id, None
+                self._jpeg_id = frame_id
+                self._jpeg = buffer.tobytes()
+            return frame_id, self._jpeg
+    
+    def _capture_loop(self, stop):
+        """
+        Capture thread: grab every frame to keep the camera queue current,
+        decode every Config.FRAME_SKIP-th one and hand it to run_monitoring
+        Only the freshest frame is kept, so a slow detector never builds up lag
+        """
+        skip = max(1, Config.FRAME_SKIP)
+        frame_idx = 0
+        
+        while not stop.is_set():
+            camera = self.camera
+            if camera is None:
+                break
+            
+            # grab() paces the loop to the camera's frame rate
+            if not camera.grab():
+                time.sleep(0.03)
+                continue
+            
+            if frame_idx % skip == 0:
+                ret, frame = camera.retrieve()
+                if ret:
+                    # Drop the stale frame if the processing thread hasn't taken it yet
+                    try:
+                        self._frame_q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    self._frame_q.put(frame)
+            frame_idx += 1
+    
+    def run_monitoring(self, stop=None):
+        """Run continuous monitoring on frames supplied by the capture thread"""
+        if stop is None:
+            stop = self._stop_event
+        while not stop.is_set():
+            try:
+                frame = self._frame_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            self._process_decoded(frame)
+    
+    def _exit_check_loop(self, stop):
+        """Mark employees as exited on a slow tick; the threshold is minutes, not frames"""
+        interval = Config.EXIT_CHECK_INTERVAL_SECONDS
+        while not stop.wait(interval):
             self.check_exits()
-            time.sleep(0.03)  # ~30 FPS
     
     def start_monitoring_thread(self):
         """Start monitoring in a background thread"""
-        if not self.is_running:
-            if self.start_camera():
-                thread = threading.Thread(target=self.run_monitoring, daemon=True)
-                thread.start()
-                return True
-        return False
+        with self._control_lock:
+            if not self.is_running:
+                if self.start_camera():
+                    # Discard any frame left over from a previous session
+                    try:
+                        self._frame_q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    
+                    # Each session gets its own stop signal, so threads of a stopped
+                    # session can never pick up again after a quick restart
+                    stop = self._stop_event = threading.Event()
+                    self._threads = [
+                        threading.Thread(target=self._capture_loop, args=(stop,), daemon=True),
+                        threading.Thread(target=self.run_monitoring, args=(stop,), daemon=True),
+                        threading.Thread(target=self._exit_check_loop, args=(stop,), daemon=True),
+                    ]
+                    self._start_event_listener()
+                    for thread in self._threads:
+                        thread.start()
+                    return True
+            return False
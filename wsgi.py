@@ -0,0 +1,11 @@
+"""
+WSGI entry point for Smart Office Monitoring System
+Run with: waitress-serve --threads=12 --port=5000 wsgi:app
+(Config.SERVER_THREADS: 8 request threads + Config.MAX_STREAM_VIEWERS stream threads)
+"""
+from app import app
+from config import Config
+
+if __name__ == '__main__':
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=5000, threads=Config.SERVER_THREADS)